@@ -1,11 +1,64 @@
-import MetaTrader5 as mt5
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import logging
+import threading
+import time
+
+from .results import CloseResult, TradeResult
 
 logger = logging.getLogger(__name__)
 
+# How long (seconds) a failed symbol lookup is remembered before probing the terminal again
+_SYMBOL_MISS_TTL = 5.0
+
+# Interval (seconds) between keepalive pings that keep the terminal IPC channel warm
+_KEEPALIVE_INTERVAL = 15.0
+
+# MetaTrader5 loads the native terminal bindings, so it is only imported once an
+# MT5Handler is created; the constants below are filled in by _import_mt5()
+mt5 = None
+
+# MetaTrader5 constants used on the trade path, bound once so each trade does a
+# plain global lookup instead of an attribute lookup on the extension module
+_BUY = _SELL = _DEAL = _GTC = _IOC = _DONE = None
+
+# Order side (upper-cased webhook action) -> MT5 order type
+_ORDER_TYPES = {}
+
+# Static fields shared by every order request; copied and filled in per trade
+_DEAL_TEMPLATE = None
+
+def _import_mt5():
+    """Import MetaTrader5 on first use and build the constants that depend on it"""
+    global mt5, _DEAL_TEMPLATE
+    global _BUY, _SELL, _DEAL, _GTC, _IOC, _DONE, _ORDER_TYPES
+    if mt5 is not None:
+        return mt5
+    
+    import MetaTrader5
+    
+    _BUY = MetaTrader5.ORDER_TYPE_BUY
+    _SELL = MetaTrader5.ORDER_TYPE_SELL
+    _DEAL = MetaTrader5.TRADE_ACTION_DEAL
+    _GTC = MetaTrader5.ORDER_TIME_GTC
+    _IOC = MetaTrader5.ORDER_FILLING_IOC
+    _DONE = MetaTrader5.TRADE_RETCODE_DONE
+    _ORDER_TYPES = {"BUY": _BUY, "LONG": _BUY, "SELL": _SELL, "SHORT": _SELL}
+    
+    _DEAL_TEMPLATE = {
+        "action": _DEAL,
+        "deviation": 20,
+        "magic": 0,
+        "type_time": _GTC,
+        "type_filling": _IOC,
+    }
+    mt5 = MetaTrader5
+    return mt5
+
 class MT5Handler:
     def __init__(self, account, password, server, path, symbol_suffix=""):
+        _import_mt5()
+        
         self.account = account
         self.password = password
         self.server = server
@@ -13,8 +66,19 @@ class MT5Handler:
         self.symbol_suffix = symbol_suffix
         self.connected = False
         
+        # Background keepalive, started on connect and stopped on disconnect
+        self._keepalive_thread = None
+        self._keepalive_stop = threading.Event()
+        
+        # TradingView symbol -> verified broker symbol
+        self.symbol_map = {}
+        # Unknown symbol -> perf_counter timestamp of the failed lookup
+        self._symbol_misses = {}
+        
     def connect(self):
         """Connect to MT5"""
+        self.symbol_map.clear()
+        self._symbol_misses.clear()
         try:
             if not mt5.initialize(self.path):
                 logger.error(f"Failed to initialize MT5: {mt5.last_error()}")
@@ -25,6 +89,7 @@ class MT5Handler:
                 return False
                 
             self.connected = True
+            self._start_keepalive()
             logger.info("Successfully connected to MT5")
             return True
             
@@ -34,14 +99,74 @@ class MT5Handler:
     
     def disconnect(self):
         """Disconnect from MT5"""
+        self._stop_keepalive()
         mt5.shutdown()
         self.connected = False
         logger.info("Disconnected from MT5")
     
+    def _start_keepalive(self):
+        """Start the keepalive thread unless it is already running
+        
+        Orders are often minutes apart, and the first call after a quiet period
+        pays for re-establishing the terminal IPC channel. A cheap terminal_info()
+        every _KEEPALIVE_INTERVAL seconds keeps it warm at the cost of a constant
+        low-rate RPC.
+        """
+        if self._keepalive_thread is not None and self._keepalive_thread.is_alive():
+            return
+        self._keepalive_stop.clear()
+        self._keepalive_thread = threading.Thread(target=self._keepalive_loop, name="mt5-keepalive", daemon=True)
+        self._keepalive_thread.start()
+    
+    def _stop_keepalive(self):
+        """Signal the keepalive thread to exit and wait for it"""
+        self._keepalive_stop.set()
+        if self._keepalive_thread is not None:
+            self._keepalive_thread.join(timeout=1.0)
+            self._keepalive_thread = None
+    
+    def _keepalive_loop(self):
+        """Ping the terminal until _keepalive_stop is set"""
+        while not self._keepalive_stop.wait(_KEEPALIVE_INTERVAL):
+            if not self.connected:
+                continue
+            if mt5.terminal_info() is None:
+                logger.warning(f"MT5 keepalive failed: {mt5.last_error()}")
+    
     def get_symbol_with_suffix(self, symbol):
         """Add suffix to symbol if configured"""
         return symbol + self.symbol_suffix
     
+    def _resolve_symbol(self, symbol):
+        """Map a TradingView symbol to the broker symbol, or None if the broker has neither form"""
+        try:
+            return self.symbol_map[symbol]
+        except KeyError:
+            pass
+        
+        # Misses expire quickly: the terminal may still be syncing symbols after login
+        missed_at = self._symbol_misses.get(symbol)
+        now = time.perf_counter()
+        if missed_at is not None and now - missed_at < _SYMBOL_MISS_TTL:
+            return None
+        
+        resolved = None
+        candidates = (self.get_symbol_with_suffix(symbol), symbol) if self.symbol_suffix else (symbol,)
+        for candidate in candidates:
+            if mt5.symbol_info(candidate) is not None:
+                resolved = candidate
+                break
+        
+        if resolved is None:
+            self._symbol_misses[symbol] = now
+            return None
+        
+        self._symbol_misses.pop(symbol, None)
+        self.symbol_map[symbol] = resolved
+        # Callers may pass the broker symbol back in (e.g. place_order -> get_positions)
+        self.symbol_map[resolved] = resolved
+        return resolved
+    
     def get_positions(self, symbol=None):
         """Get current positions"""
         if not self.connected:
@@ -49,8 +174,10 @@ class MT5Handler:
             
         try:
             if symbol:
-                symbol = self.get_symbol_with_suffix(symbol)
-                positions = mt5.positions_get(symbol=symbol)
+                mt5_symbol = self._resolve_symbol(symbol)
+                if mt5_symbol is None:
+                    return []
+                positions = mt5.positions_get(symbol=mt5_symbol)
             else:
                 positions = mt5.positions_get()
                 
@@ -60,49 +187,90 @@ class MT5Handler:
             logger.error(f"Error getting positions: {e}")
             return []
     
-    def close_all_positions_by_type(self, symbol, position_type):
-        """Close all positions of specific type (buy/sell) for a symbol"""
-        symbol = self.get_symbol_with_suffix(symbol)
-        positions = self.get_positions(symbol)
+    def _build_close_request(self, position, close_volume, comment, tick):
+        """Build the TRADE_ACTION_DEAL request that closes close_volume lots of position at tick"""
+        is_buy = position.type == _BUY
+        request = _DEAL_TEMPLATE.copy()
+        request["symbol"] = position.symbol
+        request["volume"] = close_volume
+        request["type"] = _SELL if is_buy else _BUY
+        request["position"] = position.ticket
+        request["price"] = tick.bid if is_buy else tick.ask
+        request["comment"] = comment
+        return request
+    
+    def close_position(self, position, close_volume=None, comment="Close position", tick=None):
+        """Close a position (fully, or partially when close_volume is given); returns True on success
+        
+        Batch callers pass the symbol's tick in so it is fetched once per batch
+        rather than once per position.
+        """
+        if close_volume is None:
+            close_volume = position.volume
+        
+        try:
+            if tick is None:
+                tick = mt5.symbol_info_tick(position.symbol)
+            request = self._build_close_request(position, close_volume, comment, tick)
+            result = mt5.order_send(request)
+            if result.retcode == _DONE:
+                logger.info("Closed %s lots from position %s", close_volume, position.ticket)
+                return True
+            logger.error(f"Failed to close position {position.ticket}: {result.comment}")
+            
+        except Exception as e:
+            logger.error(f"Error closing position {position.ticket}: {e}")
+        
+        return False
+    
+    def close_all_positions_by_type(self, symbol, position_type, parallel=False):
+        """Close all positions of specific type (buy/sell) for a symbol
+        
+        Closes are sent one at a time by default. parallel=True sends them from a
+        short-lived thread pool so the broker round-trips overlap; it relies on
+        the MetaTrader5 binding accepting concurrent order_send calls on one
+        terminal connection, which the binding does not document.
+        """
+        symbol = self._resolve_symbol(symbol)
+        if symbol is None:
+            return []
+        positions = [p for p in self.get_positions(symbol) if p.type == position_type]
+        if not positions:
+            return []
+        
+        tick = mt5.symbol_info_tick(symbol)
+        if tick is None:
+            logger.error(f"Failed to get tick for {symbol}")
+            return []
+        
+        if not parallel or len(positions) < 2:
+            return [p.ticket for p in positions if self.close_position(p, tick=tick)]
         
         closed_positions = []
-        for position in positions:
-            if position.type == position_type:
-                try:
-                    # Create close request
-                    request = {
-                        "action": mt5.TRADE_ACTION_DEAL,
-                        "symbol": symbol,
-                        "volume": position.volume,
-                        "type": mt5.ORDER_TYPE_SELL if position.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY,
-                        "position": position.ticket,
-                        "price": mt5.symbol_info_tick(symbol).bid if position.type == mt5.ORDER_TYPE_BUY else mt5.symbol_info_tick(symbol).ask,
-                        "deviation": 20,
-                        "magic": 0,
-                        "comment": "Close position",
-                        "type_time": mt5.ORDER_TIME_GTC,
-                        "type_filling": mt5.ORDER_FILLING_IOC,
-                    }
-                    
-                    result = mt5.order_send(request)
-                    if result.retcode == mt5.TRADE_RETCODE_DONE:
-                        closed_positions.append(position.ticket)
-                        logger.info(f"Closed position {position.ticket}")
-                    else:
-                        logger.error(f"Failed to close position {position.ticket}: {result.comment}")
-                        
-                except Exception as e:
-                    logger.error(f"Error closing position {position.ticket}: {e}")
+        with ThreadPoolExecutor(max_workers=min(8, len(positions))) as executor:
+            futures = {executor.submit(self.close_position, p, tick=tick): p.ticket for p in positions}
+            for future in as_completed(futures):
+                if future.result():
+                    closed_positions.append(futures[future])
         
         return closed_positions
     
     def close_position_by_volume(self, symbol, volume, position_type=None):
         """Close positions by specified volume (partial or full)"""
-        symbol = self.get_symbol_with_suffix(symbol)
+        symbol = self._resolve_symbol(symbol)
+        if symbol is None:
+            return []
         positions = self.get_positions(symbol)
         
         if position_type is not None:
             positions = [p for p in positions if p.type == position_type]
+        if not positions:
+            return []
+        
+        tick = mt5.symbol_info_tick(symbol)
+        if tick is None:
+            logger.error(f"Failed to get tick for {symbol}")
+            return []
         
         remaining_volume = volume
         closed_positions = []
@@ -112,48 +280,29 @@ class MT5Handler:
                 break
                 
             close_volume = min(position.volume, remaining_volume)
-            
-            try:
-                request = {
-                    "action": mt5.TRADE_ACTION_DEAL,
-                    "symbol": symbol,
-                    "volume": close_volume,
-                    "type": mt5.ORDER_TYPE_SELL if position.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY,
-                    "position": position.ticket,
-                    "price": mt5.symbol_info_tick(symbol).bid if position.type == mt5.ORDER_TYPE_BUY else mt5.symbol_info_tick(symbol).ask,
-                    "deviation": 20,
-                    "magic": 0,
-                    "comment": f"Close {close_volume} lots",
-                    "type_time": mt5.ORDER_TIME_GTC,
-                    "type_filling": mt5.ORDER_FILLING_IOC,
-                }
-                
-                result = mt5.order_send(request)
-                if result.retcode == mt5.TRADE_RETCODE_DONE:
-                    closed_positions.append(position.ticket)
-                    remaining_volume -= close_volume
-                    logger.info(f"Closed {close_volume} lots from position {position.ticket}")
-                else:
-                    logger.error(f"Failed to close position {position.ticket}: {result.comment}")
-                    
-            except Exception as e:
-                logger.error(f"Error closing position {position.ticket}: {e}")
+            if self.close_position(position, close_volume, comment=f"Close {close_volume} lots", tick=tick):
+                closed_positions.append(position.ticket)
+                remaining_volume -= close_volume
         
         return closed_positions
     
     def place_order(self, symbol, action, volume, stop_loss=None, take_profit=None):
-        """Place order with new logic"""
+        """Place order with new logic
+        
+        Returns a TradeResult for buy/sell, a CloseResult for close, or None if
+        the order could not be sent.
+        """
         if not self.connected:
             logger.error("Not connected to MT5")
             return None
             
-        symbol = self.get_symbol_with_suffix(symbol)
-        
-        # Get symbol info
-        symbol_info = mt5.symbol_info(symbol)
-        if symbol_info is None:
-            logger.error(f"Symbol {symbol} not found")
+        # Resolve the broker symbol (suffixed or bare), cached per TradingView symbol
+        mt5_symbol = self._resolve_symbol(symbol)
+        if mt5_symbol is None:
+            tried = [self.get_symbol_with_suffix(symbol), symbol] if self.symbol_suffix else [symbol]
+            logger.error(f"Symbol {symbol} not found (tried: {', '.join(tried)})")
             return None
+        symbol = mt5_symbol
         
         # Get current tick
         tick = mt5.symbol_info_tick(symbol)
@@ -162,51 +311,38 @@ class MT5Handler:
             return None
         
         try:
-            if action.lower() == "buy":
-                # ถ้าเป็นคำสั่งซื้อ และมีโพซิชั่นขายอยู่ ให้ปิดโพซิชั่นขายทั้งหมดก่อน
-                sell_positions = [p for p in self.get_positions(symbol) if p.type == mt5.ORDER_TYPE_SELL]
-                if sell_positions:
-                    logger.info(f"Closing all sell positions for {symbol} before opening buy")
-                    self.close_all_positions_by_type(symbol, mt5.ORDER_TYPE_SELL)
-                
-                # เปิดโพซิชั่นซื้อใหม่
-                order_type = mt5.ORDER_TYPE_BUY
-                price = tick.ask
-                
-            elif action.lower() == "sell":
-                # ถ้าเป็นคำสั่งขาย และมีโพซิชั่นซื้ออยู่ ให้ปิดโพซิชั่นซื้อทั้งหมดก่อน
-                buy_positions = [p for p in self.get_positions(symbol) if p.type == mt5.ORDER_TYPE_BUY]
-                if buy_positions:
-                    logger.info(f"Closing all buy positions for {symbol} before opening sell")
-                    self.close_all_positions_by_type(symbol, mt5.ORDER_TYPE_BUY)
-                
-                # เปิดโพซิชั่นขายใหม่
-                order_type = mt5.ORDER_TYPE_SELL
-                price = tick.bid
-                
-            elif action.lower() == "close":
+            action_key = action.upper()
+            if action_key == "CLOSE":
                 # ปิดโพซิชั่นตาม volume ที่ระบุ
-                logger.info(f"Closing {volume} lots for {symbol}")
+                logger.info("Closing %s lots for %s", volume, symbol)
                 closed = self.close_position_by_volume(symbol, volume)
-                return {"action": "close", "closed_positions": closed, "volume": volume}
-                
-            else:
+                return CloseResult(volume, closed)
+            
+            order_type = _ORDER_TYPES.get(action_key)
+            if order_type is None:
                 logger.error(f"Unknown action: {action}")
                 return None
+            is_buy = order_type == _BUY
+            
+            # ถ้ามีโพซิชั่นฝั่งตรงข้ามอยู่ ให้ปิดโพซิชั่นฝั่งตรงข้ามทั้งหมดก่อน
+            opposite_type = _SELL if is_buy else _BUY
+            if any(p.type == opposite_type for p in self.get_positions(symbol)):
+                logger.info(
+                    "Closing all %s positions for %s before opening %s",
+                    "sell" if is_buy else "buy", symbol, "buy" if is_buy else "sell",
+                )
+                self.close_all_positions_by_type(symbol, opposite_type)
+            
+            # เปิดโพซิชั่นใหม่
+            price = tick.ask if is_buy else tick.bid
             
             # สร้างคำสั่งซื้อ/ขาย
-            request = {
-                "action": mt5.TRADE_ACTION_DEAL,
-                "symbol": symbol,
-                "volume": float(volume),
-                "type": order_type,
-                "price": price,
-                "deviation": 20,
-                "magic": 0,
-                "comment": f"{action.upper()} order",
-                "type_time": mt5.ORDER_TIME_GTC,
-                "type_filling": mt5.ORDER_FILLING_IOC,
-            }
+            request = _DEAL_TEMPLATE.copy()
+            request["symbol"] = symbol
+            request["volume"] = float(volume)
+            request["type"] = order_type
+            request["price"] = price
+            request["comment"] = f"{action_key} order"
             
             # เพิ่ม stop loss และ take profit ถ้ามี
             if stop_loss:
@@ -217,25 +353,12 @@ class MT5Handler:
             # ส่งคำสั่ง
             result = mt5.order_send(request)
             
-            if result.retcode == mt5.TRADE_RETCODE_DONE:
-                logger.info(f"Order executed successfully: {action.upper()} {volume} {symbol} at {price}")
-                return {
-                    "action": action,
-                    "symbol": symbol,
-                    "volume": volume,
-                    "price": price,
-                    "ticket": result.order,
-                    "success": True
-                }
-            else:
-                logger.error(f"Order failed: {result.comment}")
-                return {
-                    "action": action,
-                    "symbol": symbol,
-                    "volume": volume,
-                    "success": False,
-                    "error": result.comment
-                }
+            if result.retcode == _DONE:
+                logger.info("Order executed successfully: %s %s %s at %s", action_key, volume, symbol, price)
+                return TradeResult(action, symbol, volume, True, price=price, ticket=result.order)
+            
+            logger.error(f"Order failed: {result.comment}")
+            return TradeResult(action, symbol, volume, False, error=result.comment)
                 
         except Exception as e:
             logger.error(f"Error placing order: {e}")
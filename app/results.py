@@ -0,0 +1,33 @@
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True)
+class TradeResult:
+    """Outcome of a buy/sell order sent by MT5Handler.place_order"""
+    action: str
+    symbol: str
+    volume: float
+    success: bool
+    price: float | None = None
+    ticket: int | None = None
+    error: str | None = None
+    
+    def to_dict(self):
+        """Convert to the dict returned by the webhook API"""
+        result = {"action": self.action, "symbol": self.symbol, "volume": self.volume}
+        if self.success:
+            result.update(price=self.price, ticket=self.ticket, success=True)
+        else:
+            result.update(success=False, error=self.error)
+        return result
+
+
+@dataclass(slots=True)
+class CloseResult:
+    """Outcome of closing a volume of positions via MT5Handler.place_order"""
+    volume: float
+    closed_positions: list = field(default_factory=list)
+    
+    def to_dict(self):
+        """Convert to the dict returned by the webhook API"""
+        return {"action": "close", "closed_positions": self.closed_positions, "volume": self.volume}
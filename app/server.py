@@ -56,7 +56,7 @@ def webhook():
         except (ValueError, TypeError):
             volume = float(Config().DEFAULT_VOLUME)
         
-        logger.info(f"Received webhook: {action} {volume} {symbol}")
+        logger.info("Received webhook: %s %s %s", action, volume, symbol)
         
         # Check MT5 connection
         if not mt5_handler or not mt5_handler.connected:
@@ -79,11 +79,11 @@ def webhook():
             )
             
             if result:
-                logger.info(f"Order result: {result}")
+                logger.info("Order result: %s", result)
                 return jsonify({
                     "status": "success",
                     "message": f"{action.upper()} order processed",
-                    "data": result
+                    "data": result.to_dict()
                 }), 200
             else:
                 logger.error("Failed to process order")
@@ -167,7 +167,7 @@ def close_positions():
             return jsonify({
                 "status": "success",
                 "message": f"Closed {volume} lots for {symbol}",
-                "data": result
+                "data": result.to_dict()
             }), 200
         else:
             return jsonify({"error": "Failed to close positions"}), 500
@@ -85,23 +85,25 @@ def test_mt5_connection():
         if rates is None or len(rates) == 0:
             print(f"Failed to get rate data for {symbol}")
         else:
-            # Convert to pandas dataframe for better display
-            rates_df = pd.DataFrame(rates)
-            rates_df['time'] = pd.to_datetime(rates_df['time'], unit='s')
+            # Read the field names straight from the numpy structured array
+            cols = rates.dtype.names or ()
             print("\nRecent 1-minute candles:")
             
             # Check for column name differences (some brokers use 'tick_volume' instead of 'volume')
-            volume_col = 'volume' if 'volume' in rates_df.columns else 'tick_volume'
+            volume_col = 'volume' if 'volume' in cols else 'tick_volume'
             
             # Print available columns
-            print(f"Available columns: {list(rates_df.columns)}")
+            print(f"Available columns: {list(cols)}")
             
             # Display data with available columns
             display_cols = ['time', 'open', 'high', 'low', 'close'] 
-            if volume_col in rates_df.columns:
+            if volume_col in cols:
                 display_cols.append(volume_col)
-                
-            print(rates_df[display_cols])
+            
+            # Convert only the displayed columns to a pandas dataframe
+            rates_df = pd.DataFrame(rates[display_cols])
+            rates_df['time'] = pd.to_datetime(rates_df['time'], unit='s')
+            print(rates_df)
     
     # Test open positions
     positions = mt5.positions_get()